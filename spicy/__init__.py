@@ -1,14 +1,38 @@
 # spicy/__init__.py
-from .client import SpicyClient, ChatSession # Added ChatSession
+from typing import TYPE_CHECKING
+
 from ._exceptions import SpicychatError, AuthenticationError, APIError, RateLimitError, NotFoundError
-from ._models import (
-    User, Persona, Character, Message, Conversation, GeneratedImage, TokenData, UserSettings, GenerationSettings
-)
 from ._constants import ImageModel, ChatModel, RatingAction
 
+if TYPE_CHECKING:
+    from .client import SpicyClient, ChatSession
+    from ._models import (
+        User, Persona, Character, Message, Conversation, GeneratedImage, TokenData, UserSettings, GenerationSettings
+    )
+
 __all__ = [
     "SpicyClient", "ChatSession",
-    "SpicychatError", "AuthenticationError", "APIError",
-    "User", "Persona", "Character", "Message", "GenerationSettings",
-    "ChatModel"
+    "SpicychatError", "AuthenticationError", "APIError", "RateLimitError", "NotFoundError",
+    "User", "Persona", "Character", "Message", "Conversation", "GeneratedImage",
+    "TokenData", "UserSettings", "GenerationSettings",
+    "ImageModel", "ChatModel", "RatingAction",
 ]
+
+# The client pulls in httpx, bs4 and the auth stack, and the models pull in
+# pydantic; only load them when asked for (PEP 562).
+_LAZY_ATTRS = {
+    "SpicyClient": "client", "ChatSession": "client",
+    "User": "_models", "Persona": "_models", "Character": "_models", "Message": "_models",
+    "Conversation": "_models", "GeneratedImage": "_models", "TokenData": "_models",
+    "UserSettings": "_models", "GenerationSettings": "_models",
+}
+
+def __getattr__(name: str):
+    module = _LAZY_ATTRS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    return getattr(importlib.import_module(f".{module}", __name__), name)
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -4,20 +4,24 @@
 
 import json
 import os
+import re
+import html
 import secrets
 import hashlib
 import base64
 import asyncio
-import datetime
+import logging
+import time
 from pathlib import Path
 from typing import Optional, Callable, Awaitable, Tuple
-from urllib.parse import urlparse, parse_qs
 
 import httpx
-from bs4 import BeautifulSoup
+import orjson
+from pydantic import ValidationError
 
 from ._models import TokenData
 from ._exceptions import AuthenticationError
+from ._http import parse_json
 from ._constants import (
     CLIENT_ID, REDIRECT_URI, AUTH_ENDPOINT, TOKEN_ENDPOINT, OTP_SUBMIT_ENDPOINT
 )
@@ -25,11 +29,37 @@ from ._constants import (
 CONFIG_DIR = Path.home() / ".config" / "spicychat-api"
 TOKEN_FILE = CONFIG_DIR / "tokens.json"
 
+# Tokens with less than this many seconds left are refreshed in the background.
+REFRESH_WINDOW = 300
+# After a failed background refresh, wait this long before trying again (unless the token expires first).
+REFRESH_RETRY_DELAY = 30
+
+logger = logging.getLogger(__name__)
+
+# Fast path for the OTP page: both values are plain attributes on well-known tags.
+_CSRF_RE = re.compile(rb'<meta[^>]+name=["\']csrf-token["\'][^>]+content=["\']([^"\']+)', re.I)
+_PSID_RE = re.compile(rb'name=["\']p_psid["\'][^>]+value=["\']([^"\']+)', re.I)
+
+_OTP_INVALID_MARKER = b"Please enter a valid confirmation code"
+
 class AuthManager:
     def __init__(self):
-        self._auth_client = httpx.AsyncClient(follow_redirects=True, timeout=30.0)
+        # Login is a chain of sequential calls to gamma.kinde.com; keep the
+        # connection alive (and multiplexed) across all of them.
+        self._auth_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            follow_redirects=True,
+            timeout=30.0
+        )
         self._token_data: Optional[TokenData] = None
+        # Wall-clock deadlines for the current token, computed once per token.
+        self._refresh_at = 0.0
+        self._expires_at = 0.0
         self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        # Monotonic time before which a stale token is not refreshed again, set on failure.
+        self._retry_refresh_at = 0.0
 
     async def close(self):
         await self._auth_client.aclose()
@@ -37,7 +67,7 @@ class AuthManager:
     def _generate_pkce(self) -> Tuple[str, str]:
         code_verifier = secrets.token_urlsafe(64)
         hashed = hashlib.sha256(code_verifier.encode('utf-8')).digest()
-        code_challenge = base64.urlsafe_b64encode(hashed).decode('utf-8').replace('=', '')
+        code_challenge = base64.urlsafe_b64encode(hashed).rstrip(b'=').decode('ascii')
         return code_verifier, code_challenge
 
     async def _request_otp(self, email: str, code_challenge: str) -> Tuple[str, str]:
@@ -62,16 +92,32 @@ class AuthManager:
             raise AuthenticationError(f"Failed to get OTP page: {response.status_code} {response.text}")
 
         print("OTP page received. Parsing for credentials...")
-        soup = BeautifulSoup(response.text, 'html.parser')
+        csrf_match = _CSRF_RE.search(response.content)
+        psid_match = _PSID_RE.search(response.content)
+
+        if csrf_match and psid_match:
+            csrf = html.unescape(csrf_match.group(1).decode('utf-8'))
+            psid = html.unescape(psid_match.group(1).decode('utf-8'))
+        else:
+            # Unusual markup (attribute order, quoting) - let the real parser handle it.
+            # bs4 is only needed on these fallback paths, so it is imported here.
+            from bs4 import BeautifulSoup, SoupStrainer
+
+            # Only build tree nodes for the tags we actually read.
+            soup = BeautifulSoup(
+                response.content, 'lxml',
+                parse_only=SoupStrainer(["meta", "input"]),
+                from_encoding=response.encoding or 'utf-8'
+            )
 
-        csrf_token_tag = soup.find('meta', {'name': 'csrf-token'})
-        psid_tag = soup.find('input', {'name': 'p_psid'})
+            csrf_token_tag = soup.find('meta', {'name': 'csrf-token'})
+            psid_tag = soup.find('input', {'name': 'p_psid'})
 
-        if not csrf_token_tag or not psid_tag:
-            raise AuthenticationError("Could not find CSRF token or PSID on the page.")
+            if not csrf_token_tag or not psid_tag:
+                raise AuthenticationError("Could not find CSRF token or PSID on the page.")
 
-        csrf = csrf_token_tag['content']
-        psid = psid_tag['value']
+            csrf = csrf_token_tag['content']
+            psid = psid_tag['value']
 
         if 'kbtc' not in self._auth_client.cookies:
             raise AuthenticationError("Failed to get kbtc cookie.")
@@ -105,23 +151,27 @@ class AuthManager:
         if post_response.status_code != 200:
             raise AuthenticationError(f"OTP submission failed with unexpected status: {post_response.status_code} - {post_response.text}")
 
+        # A mistyped code is the common failure; spot it on the raw body before decoding anything.
+        if _OTP_INVALID_MARKER in post_response.content:
+            raise AuthenticationError("OTP submission failed. The code was likely incorrect or expired. Please try again.")
+
         try:
-            response_data = post_response.json()
+            response_data = parse_json(post_response)
             nested_json_str = response_data.get('json', '')
             html_content = response_data.get('html', '')
 
             # Case: OTP Failed (Server returns 200, empty 'json', and error message in 'html')
             if not nested_json_str and html_content:
-                if "Please enter a valid confirmation code" in html_content:
-                    raise AuthenticationError("OTP submission failed. The code was likely incorrect or expired. Please try again.")
-                else:
-                    # Try to parse the HTML to see if there is another error message
-                    soup = BeautifulSoup(html_content, 'html.parser')
-                    error_msg = soup.find(class_='kinde-control-associated-text-variant-invalid-message')
-                    if error_msg:
-                        raise AuthenticationError(f"OTP submission failed: {error_msg.get_text(strip=True)}")
+                # Try to parse the HTML to see if there is another error message
+                from bs4 import BeautifulSoup, SoupStrainer
 
-                    raise AuthenticationError("OTP submission returned an HTML response indicating failure, but no specific error message was found.")
+                error_class = 'kinde-control-associated-text-variant-invalid-message'
+                soup = BeautifulSoup(html_content, 'lxml', parse_only=SoupStrainer(class_=error_class))
+                error_msg = soup.find(class_=error_class)
+                if error_msg:
+                    raise AuthenticationError(f"OTP submission failed: {error_msg.get_text(strip=True)}")
+
+                raise AuthenticationError("OTP submission returned an HTML response indicating failure, but no specific error message was found.")
 
             # Case: OTP Success
             redirect_info = json.loads(nested_json_str)
@@ -140,19 +190,17 @@ class AuthManager:
         final_response = await self._auth_client.get(redirect_location)
 
         # The final URL after all redirects will contain the authorization code.
-        final_url = str(final_response.url)
-        parsed_url = urlparse(final_url)
-        query_params = parse_qs(parsed_url.query)
+        query_params = final_response.url.params
 
         if 'error' in query_params:
-            error = query_params.get('error', ['Unknown error'])[0]
+            error = query_params.get('error') or 'Unknown error'
             raise AuthenticationError(
                 f"Authentication failed after redirect. Server returned error: '{error}'."
             )
 
-        code = query_params.get("code", [None])[0]
+        code = query_params.get("code")
         if not code:
-            raise AuthenticationError(f"Could not extract authorization code from final redirect URL. Full URL: {final_url}")
+            raise AuthenticationError(f"Could not extract authorization code from final redirect URL. Full URL: {final_response.url}")
 
         return code
 
@@ -171,40 +219,140 @@ class AuthManager:
         if not response.is_success:
              raise AuthenticationError(f"Token exchange failed: {response.status_code} - {response.text}")
 
-        return TokenData(**response.json())
+        return TokenData.model_validate(parse_json(response))
 
-    def _save_token(self, token_data: TokenData):
+    def _save_token_sync(self, token_data: TokenData):
         CONFIG_DIR.mkdir(parents=True, exist_ok=True)
-        with open(TOKEN_FILE, "w") as f:
-            f.write(token_data.model_dump_json())
+        TOKEN_FILE.write_bytes(orjson.dumps(token_data.model_dump()))
 
-    def _load_token(self) -> Optional[TokenData]:
+    def _load_token_sync(self) -> Optional[TokenData]:
         if not TOKEN_FILE.exists():
             return None
         try:
-            with open(TOKEN_FILE, "r") as f:
-                data = json.load(f)
-                return TokenData(**data)
-        except (json.JSONDecodeError, TypeError, FileNotFoundError):
+            return TokenData.model_validate(orjson.loads(TOKEN_FILE.read_bytes()))
+        except (orjson.JSONDecodeError, ValidationError, FileNotFoundError):
             if TOKEN_FILE.exists():
                 os.remove(TOKEN_FILE)
             return None
 
+    def _remove_token_sync(self):
+        if TOKEN_FILE.exists():
+            os.remove(TOKEN_FILE)
+
+    # Disk access runs in a worker thread so it never stalls the event loop.
+    async def _save_token(self, token_data: TokenData):
+        await asyncio.to_thread(self._save_token_sync, token_data)
+
+    async def _load_token(self) -> Optional[TokenData]:
+        return await asyncio.to_thread(self._load_token_sync)
+
+    async def _refresh_token(self) -> TokenData:
+        current = self._token_data
+        data = {
+            "client_id": CLIENT_ID,
+            "grant_type": "refresh_token",
+            "refresh_token": current.refresh_token
+        }
+        headers = {"kinde-sdk": "React/4.0.5", "origin": "https://spicychat.ai"}
+
+        response = await self._auth_client.post(TOKEN_ENDPOINT, data=data, headers=headers)
+
+        if not response.is_success:
+            raise AuthenticationError(f"Token refresh failed: {response.status_code} - {response.text}")
+
+        # A 200 with a body we cannot use is as much a failed refresh as a 4xx.
+        try:
+            payload = parse_json(response)
+        except ValueError as e:
+            raise AuthenticationError(f"Token refresh returned invalid JSON: {e}") from e
+        if not isinstance(payload, dict):
+            raise AuthenticationError(f"Token refresh returned an unexpected body: {response.text}")
+
+        # Kinde may omit tokens that were not rotated; keep the ones we have.
+        payload.setdefault("refresh_token", current.refresh_token)
+        payload.setdefault("id_token", current.id_token)
+        try:
+            token_data = TokenData.model_validate(payload)
+        except ValidationError as e:
+            raise AuthenticationError(f"Token refresh returned an invalid token: {e}") from e
+
+        self._set_token(token_data)
+        await self._save_token(token_data)
+        return token_data
+
+    async def _do_refresh(self) -> TokenData:
+        try:
+            return await self._refresh_token()
+        except Exception:
+            self._retry_refresh_at = time.monotonic() + REFRESH_RETRY_DELAY
+            raise
+        finally:
+            self._refresh_task = None
+
+    def _start_refresh(self) -> asyncio.Task:
+        """Returns the in-flight refresh, starting one if needed. Call with the lock held."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._do_refresh())
+            self._refresh_task.add_done_callback(self._log_refresh_failure)
+        return self._refresh_task
+
+    @staticmethod
+    def _log_refresh_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Token refresh failed: {task.exception()}")
+
+    def _set_token(self, token_data: Optional[TokenData]):
+        self._token_data = token_data
+        self._retry_refresh_at = 0.0
+        if token_data:
+            self._expires_at = token_data.created_at + token_data.expires_in
+            self._refresh_at = self._expires_at - REFRESH_WINDOW
+        else:
+            self._expires_at = self._refresh_at = 0.0
+
+    async def _discard_token(self):
+        self._set_token(None)
+        await asyncio.to_thread(self._remove_token_sync)
+
     async def get_token(self) -> Optional[TokenData]:
+        """
+        Returns a usable access token, refreshing it when needed.
+
+        Fresh tokens are returned as-is. Tokens inside the refresh window are
+        returned immediately while a refresh runs in the background. Expired
+        tokens are refreshed before returning; None means a new login is needed.
+        """
+        # Fast path: a fresh token needs no lock. The deadlines are only ever
+        # replaced together with the token, so this read cannot see a mismatch.
+        if self._token_data and time.time() < self._refresh_at:
+            return self._token_data
+
         async with self._lock:
             if not self._token_data:
-                self._token_data = self._load_token()
+                self._set_token(await self._load_token())
 
             if not self._token_data:
                 return None
 
-            if (datetime.datetime.now().timestamp() - self._token_data.created_at) > (self._token_data.expires_in - 300):
-                self._token_data = None
-                if TOKEN_FILE.exists():
-                    os.remove(TOKEN_FILE)
-                return None
+            now = time.time()
+            if now < self._refresh_at:
+                return self._token_data
 
-            return self._token_data
+            if now < self._expires_at:
+                # Stale: refresh in the background, but back off after a failure.
+                if time.monotonic() >= self._retry_refresh_at:
+                    self._start_refresh()
+                return self._token_data
+
+            refresh = self._start_refresh()
+
+        # Expired: every caller awaits the same refresh task. Shielded so one
+        # cancelled caller does not cancel the refresh for the others.
+        try:
+            return await asyncio.shield(refresh)
+        except (AuthenticationError, httpx.HTTPError):
+            await self._discard_token()
+            return None
 
     async def login(
         self,
@@ -212,7 +360,7 @@ class AuthManager:
         otp_callback: Callable[[], Awaitable[str]]
     ):
         async with self._lock:
-            if self._token_data or self._load_token():
+            if self._token_data or await self._load_token():
                 return
 
             print("Starting new login process...")
@@ -227,7 +375,7 @@ class AuthManager:
             auth_code = await self._submit_otp(otp, csrf, psid)
 
             print("Exchanging authorization code for token...")
-            self._token_data = await self._exchange_code_for_token(auth_code, verifier)
+            self._set_token(await self._exchange_code_for_token(auth_code, verifier))
 
-            self._save_token(self._token_data)
+            await self._save_token(self._token_data)
             print("Login successful. Tokens saved.")
@@ -1,7 +1,7 @@
 # spicy/_constants.py
 
 from enum import Enum
-import uuid
+from typing import Optional
 
 # --- API Endpoints ---
 BASE_URL = "https://4mpanjbsf6.execute-api.us-east-1.amazonaws.com"
@@ -15,7 +15,16 @@ REDIRECT_URI = "https://spicychat.ai"
 AUTH_ENDPOINT = f"{AUTH_BASE_URL}/oauth2/auth"
 TOKEN_ENDPOINT = f"{AUTH_BASE_URL}/oauth2/token"
 OTP_SUBMIT_ENDPOINT = f"{AUTH_BASE_URL}/end_user_pages/widgets/partials/otp/otp_code_form"
-DEFAULT_GUEST_ID = str(uuid.uuid4())
+
+# Generated on first use; importing the package should not touch the RNG.
+_DEFAULT_GUEST_ID: Optional[str] = None
+
+def get_default_guest_id() -> str:
+    global _DEFAULT_GUEST_ID
+    if _DEFAULT_GUEST_ID is None:
+        import uuid
+        _DEFAULT_GUEST_ID = str(uuid.uuid4())
+    return _DEFAULT_GUEST_ID
 
 # --- Headers ---
 BASE_HEADERS = {
@@ -31,7 +40,6 @@ BASE_HEADERS = {
     'sec-fetch-site': 'cross-site',
     'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
     'x-app-id': 'spicychat',
-    'x-guest-userid': DEFAULT_GUEST_ID,
 }
 
 # --- Enums for Models ---
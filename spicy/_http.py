@@ -1,27 +1,48 @@
 # spicy/_http.py
 
 import httpx
+import orjson
 from typing import Optional, Dict, Any, TYPE_CHECKING
 import logging
 
 from ._exceptions import APIError, AuthenticationError, RateLimitError, NotFoundError
-from ._constants import BASE_HEADERS, DEFAULT_GUEST_ID
+from ._constants import BASE_HEADERS, get_default_guest_id
 
 if TYPE_CHECKING:
     from ._auth import AuthManager
 
 logger = logging.getLogger(__name__)
 
+_ERROR_TYPES = {
+    404: NotFoundError,
+    429: RateLimitError,
+}
+
+def parse_json(response: httpx.Response) -> Any:
+    """Decodes a JSON response body with orjson, falling back to httpx for odd encodings."""
+    try:
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        return response.json()
+
 class HttpManager:
+    """
+    Shared transport for every API call a SpicyClient makes.
+
+    One HTTP/2 client per SpicyClient: concurrent requests to the same host
+    (e.g. the four-way fan-out in _post_login_setup) are multiplexed as
+    streams over a single TCP+TLS connection instead of opening one each.
+    """
     def __init__(self, auth_manager: "AuthManager", guest_id: Optional[str] = None):
         self._auth_manager = auth_manager
-        self._guest_id = guest_id or DEFAULT_GUEST_ID
+        self._guest_id = guest_id or get_default_guest_id()
         self._client = httpx.AsyncClient(
-            headers=BASE_HEADERS,
+            headers={**BASE_HEADERS, "x-guest-userid": self._guest_id},
             timeout=30.0,
-            follow_redirects=True
+            follow_redirects=True,
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=128, keepalive_expiry=60.0)
         )
-        self._client.headers["x-guest-userid"] = self._guest_id
 
     async def _request(
         self,
@@ -30,7 +51,14 @@ class HttpManager:
         authenticated: bool = False,
         **kwargs
     ) -> httpx.Response:
-        headers = kwargs.get("headers", {})
+        # Copied so shared header dicts passed in by callers are never mutated.
+        headers = dict(kwargs.get("headers") or ())
+        # Encode JSON bodies with orjson rather than letting httpx use the stdlib encoder.
+        body = kwargs.pop("json", None)
+        if body is not None:
+            kwargs["content"] = orjson.dumps(body)
+            headers["content-type"] = "application/json"
+
         if authenticated:
             token = await self._auth_manager.get_token()
             if not token:
@@ -38,11 +66,16 @@ class HttpManager:
             headers["authorization"] = f"Bearer {token.access_token}"
 
         kwargs["headers"] = headers
-        logger.debug(f"Request: {method} {url} Headers: {headers} Body: {kwargs.get('json') or kwargs.get('data')}")
+        # The debug lines format headers and decode the whole body, so only
+        # build them when someone is listening.
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug(f"Request: {method} {url} Headers: {headers} Body: {body if body is not None else kwargs.get('content') or kwargs.get('data')}")
 
         response = await self._client.request(method, url, **kwargs)
 
-        logger.debug(f"Response: {response.status_code} Body: {response.text[:200]}")
+        if debug:
+            logger.debug(f"Response: {response.status_code} Body: {response.text[:200]}")
 
         if not response.is_success:
             self.handle_error(response)
@@ -50,20 +83,17 @@ class HttpManager:
         return response
 
     def handle_error(self, response: httpx.Response):
-        try:
-            error_data = response.json()
-            message = error_data.get("message", response.text)
-        except Exception:
-            message = response.text
+        message = response.text
+        # HTML error pages (gateways, CDN) are not worth a failed JSON parse.
+        if "application/json" in response.headers.get("content-type", ""):
+            try:
+                message = parse_json(response).get("message", message)
+            except Exception:
+                pass
 
         if response.status_code == 401:
             raise AuthenticationError(f"Authentication failed: {message}")
-        elif response.status_code == 404:
-            raise NotFoundError(response.status_code, message)
-        elif response.status_code == 429:
-            raise RateLimitError(response.status_code, message)
-        else:
-            raise APIError(response.status_code, message)
+        raise _ERROR_TYPES.get(response.status_code, APIError)(response.status_code, message)
 
     async def get(self, url: str, authenticated: bool = False, **kwargs) -> httpx.Response:
         return await self._request("GET", url, authenticated=authenticated, **kwargs)
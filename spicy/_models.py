@@ -31,6 +31,10 @@ class User(BaseModel):
     token: str
     subscription: UserSubscription
 
+class UserResponse(BaseModel):
+    """Envelope of GET /v2/users."""
+    user: User
+
 class Persona(BaseModel):
     id: str
     name: str
@@ -74,6 +78,14 @@ class Message(BaseModel):
     prev_id: Optional[str] = None
     createdAt: Optional[float] = None
 
+class MessageResponse(BaseModel):
+    """Envelope of the chat endpoint's reply."""
+    message: Message
+
+class MessagesResponse(BaseModel):
+    """Envelope of a character's message history."""
+    messages: List[Message] = Field(default_factory=list)
+
 class DeletedMessage(Message):
     deletedAt: int
     deleteReason: str
@@ -94,6 +106,10 @@ class SearchResult(BaseModel):
     found: int
     hits: List[SearchHit]
 
+class SearchResponse(BaseModel):
+    """Typesense multi_search envelope, validated straight from the raw response bytes."""
+    results: List[SearchResult]
+
 class GeneratedImage(BaseModel):
     key: str
     signed_url: HttpUrl
@@ -4,13 +4,19 @@
 
 import asyncio
 import logging
-import json
 import mimetypes
 import hashlib
-from typing import Optional, List, Callable, Awaitable, Dict, Any, Union
+import time
+from collections import OrderedDict
+from typing import Optional, List, Callable, Awaitable, Dict, Any, Union, Tuple
+
+import httpx
+import orjson
+from pydantic import TypeAdapter
 
 from ._auth import AuthManager
-from ._http import HttpManager
+from ._http import HttpManager, parse_json
+from ._exceptions import AuthenticationError, APIError
 from ._models import *
 from ._constants import *
 
@@ -19,6 +25,58 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# How long (seconds) idempotent GET results are reused before hitting the API again.
+_APP_SETTINGS_TTL = 3600.0
+_USER_SETTINGS_TTL = 60.0
+_PERSONAS_TTL = 60.0
+_SEARCH_TTL = 60.0
+_SEARCH_CACHE_SIZE = 128
+
+# Recombee interactions are queued and sent through its /batch/ endpoint.
+_RECOMBEE_FLUSH_INTERVAL = 0.2
+_RECOMBEE_MAX_BATCH = 50
+
+# List validators are compiled once here, never per request.
+_PERSONA_LIST = TypeAdapter(List[Persona])
+_CONVERSATION_LIST = TypeAdapter(List[Conversation])
+_DELETED_LIST = TypeAdapter(List[DeletedMessage])
+
+# Typesense search body, pre-encoded around the two fields that change per call:
+# _SEARCH_PREFIX <q> _SEARCH_MID <per_page> _SEARCH_SUFFIX
+_SEARCH_EXCLUDED = ("application_ids", "greeting", "moderation_flags", "moderation_keywords", "moderation_status", "reportsType")
+_SEARCH_STATIC = {
+    "query_by": "name,title,tags,creator_username,character_id",
+    "exclude_fields": ",".join(_SEARCH_EXCLUDED),
+    # Only ship the document fields Character models (minus the excluded ones); Typesense drops the rest server-side.
+    "include_fields": ",".join(f for f in Character.model_fields if f not in _SEARCH_EXCLUDED),
+    "sort_by": "num_messages_24h:desc",
+    "collection": "public_characters_alias",
+}
+_SEARCH_PREFIX = orjson.dumps({"searches": [_SEARCH_STATIC]})[:-3] + b',"q":'
+_SEARCH_MID = b',"per_page":'
+_SEARCH_SUFFIX = b'}]}'
+_SEARCH_HEADERS = {"content-type": "text/plain"}
+
+# Dumped once; payloads are serialized immediately, so sharing this dict is safe.
+_DEFAULT_INFERENCE = GenerationSettings().model_dump()
+
+def _inference_settings(generation_settings: Optional[Union[GenerationSettings, Dict[str, Any]]]) -> Dict[str, Any]:
+    if not generation_settings:
+        return _DEFAULT_INFERENCE
+    if isinstance(generation_settings, dict):
+        generation_settings = GenerationSettings.model_validate(generation_settings)
+    return generation_settings.model_dump()
+
+def _read_and_hash(path: str) -> Tuple[bytes, str]:
+    """Reads an upload and computes its MD5 in one pass, hashing each chunk while it is still hot in cache."""
+    digest = hashlib.md5()
+    chunks = []
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+            chunks.append(chunk)
+    return b"".join(chunks), digest.hexdigest()
+
 async def default_otp_callback() -> str:
     print("\n" + "="*40)
     print("AUTHENTICATION REQUIRED")
@@ -30,6 +88,12 @@ class ChatSession:
     """
     A high-level wrapper for a persistent conversation.
     """
+    __slots__ = (
+        "_client", "character", "conversation_id", "_history_objs", "_history_index",
+        "last_user_message_id", "last_bot_message_id", "_lock", "max_history",
+        "model", "settings", "persona_id",
+    )
+
     def __init__(self, client: "SpicyClient", character: Character, conversation_id: Optional[str] = None):
         self._client = client
         self.character = character
@@ -37,11 +101,19 @@ class ChatSession:
 
         # We store the full message objects here
         self._history_objs: List[Message] = []
+        # id -> message, kept in step with _history_objs for O(1) edits
+        self._history_index: Dict[str, Message] = {}
 
         # Internal state tracking
         self.last_user_message_id: Optional[str] = None
         self.last_bot_message_id: Optional[str] = None
 
+        # Serializes history-mutating calls on this session; other sessions run freely.
+        self._lock = asyncio.Lock()
+
+        # Only the most recent messages are kept locally; older ones stay on the server.
+        self.max_history = 200
+
         # Default settings
         self.model = ChatModel.SPICEDQ3_A3B
         self.settings = GenerationSettings()
@@ -55,15 +127,29 @@ class ChatSession:
 
         logger.info(f"Loading history for conversation {self.conversation_id}...")
         msgs = await self._client.get_conversation_history(self.character.id, limit=limit)
+        self._set_history(msgs)
 
+    def _set_history(self, msgs: List[Message]):
+        """Installs history as returned by the API (Newest -> Oldest)."""
         # Reverse to get chronological order (Oldest -> Newest)
         self._history_objs = msgs[::-1]
+        self._history_index = {m.id: m for m in self._history_objs}
+        self._trim_history()
 
         if self._history_objs:
             self._update_ids()
 
         logger.info(f"Restored {len(self._history_objs)} messages.")
 
+    def _trim_history(self):
+        """Drops the oldest messages beyond max_history. The tail is kept, so the id pointers stay valid."""
+        excess = len(self._history_objs) - self.max_history
+        if excess <= 0:
+            return
+        for msg in self._history_objs[:excess]:
+            self._history_index.pop(msg.id, None)
+        del self._history_objs[:excess]
+
     def _update_ids(self):
         """Internal helper to refresh ID pointers based on current history."""
         if not self._history_objs:
@@ -71,28 +157,26 @@ class ChatSession:
             self.last_bot_message_id = None
             return
 
-        # Find last bot message
+        # One reverse pass; stop as soon as both pointers are found.
+        user_id = bot_id = None
         for msg in reversed(self._history_objs):
-            if msg.role != "user":
-                self.last_bot_message_id = msg.id
+            role = msg.role
+            if role == "user":
+                if user_id is None: user_id = msg.id
+            elif bot_id is None:
+                bot_id = msg.id
+            if user_id is not None and bot_id is not None:
                 break
 
-        # Find last user message
-        for msg in reversed(self._history_objs):
-            if msg.role == "user":
-                self.last_user_message_id = msg.id
-                break
+        # Keep the previous pointer if history has no message of that role.
+        if user_id is not None: self.last_user_message_id = user_id
+        if bot_id is not None: self.last_bot_message_id = bot_id
 
     def history(self, limit: int = 10) -> List[str]:
         """Returns a human-readable list of the last N messages."""
-        display_list = []
+        char_name = self.character.name
         msgs_to_show = self._history_objs[-limit:] if limit > 0 else self._history_objs
-
-        for msg in msgs_to_show:
-            name = "You" if msg.role == "user" else self.character.name
-            display_list.append(f"{name}: {msg.content}")
-
-        return display_list
+        return [f"{'You' if msg.role == 'user' else char_name}: {msg.content}" for msg in msgs_to_show]
 
     def reset(self):
         """
@@ -101,112 +185,140 @@ class ChatSession:
         """
         self.conversation_id = None
         self._history_objs = []
+        self._history_index = {}
         self.last_user_message_id = None
         self.last_bot_message_id = None
         logger.info("Chat session reset. Next message will start a new conversation.")
 
     async def send(self, message: str, **kwargs) -> Message:
         """Sends a message."""
-        current_settings = self.settings.model_copy(update=kwargs)
-
-        # 1. Send to API
-        response = await self._client.send_message(
-            character_id=self.character.id,
-            message=message,
-            model=self.model,
-            persona_id=self.persona_id,
-            conversation_id=self.conversation_id,
-            generation_settings=current_settings
-        )
-
-        self.conversation_id = response.conversation_id
-
-        # 2. Construct User Message for local history (Critical for Undo/Edit)
-        user_msg = Message(
-            id=response.prev_id,
-            role="user",
-            content=message,
-            conversation_id=response.conversation_id
-        )
-
-        # 3. Update History
-        self._history_objs.append(user_msg)
-        self._history_objs.append(response)
-        self._update_ids()
+        async with self._lock:
+            current_settings = self.settings.model_copy(update=kwargs) if kwargs else self.settings
+
+            # 1. Send to API
+            response = await self._client.send_message(
+                character_id=self.character.id,
+                message=message,
+                model=self.model,
+                persona_id=self.persona_id,
+                conversation_id=self.conversation_id,
+                generation_settings=current_settings
+            )
+
+            self.conversation_id = response.conversation_id
+
+            # 2. Construct User Message for local history (Critical for Undo/Edit)
+            user_msg = Message(
+                id=response.prev_id,
+                role="user",
+                content=message,
+                conversation_id=response.conversation_id
+            )
+
+            # 3. Update History
+            self._history_objs.append(user_msg)
+            self._history_objs.append(response)
+            self._history_index[user_msg.id] = user_msg
+            self._history_index[response.id] = response
+            self.last_user_message_id = user_msg.id
+            self.last_bot_message_id = response.id
+            self._trim_history()
 
-        return response
+            return response
 
     async def regenerate(self, **kwargs) -> Message:
         """Regenerates the last bot response."""
-        if not self.conversation_id or not self.last_user_message_id:
-            raise ValueError("Cannot regenerate: No conversation history available.")
-
-        current_settings = self.settings.model_copy(update=kwargs)
-        response = await self._client.regenerate_response(
-            conversation_id=self.conversation_id,
-            character_id=self.character.id,
-            last_user_message_id=self.last_user_message_id,
-            model=self.model,
-            generation_settings=current_settings
-        )
-
-        # Replace the last message
-        if self._history_objs and self._history_objs[-1].role != "user":
-            self._history_objs[-1] = response
+        async with self._lock:
+            if not self.conversation_id or not self.last_user_message_id:
+                raise ValueError("Cannot regenerate: No conversation history available.")
+
+            current_settings = self.settings.model_copy(update=kwargs) if kwargs else self.settings
+            response = await self._client.regenerate_response(
+                conversation_id=self.conversation_id,
+                character_id=self.character.id,
+                last_user_message_id=self.last_user_message_id,
+                model=self.model,
+                generation_settings=current_settings
+            )
+
+            # Replace the last message
+            if self._history_objs and self._history_objs[-1].role != "user":
+                self._history_index.pop(self._history_objs[-1].id, None)
+                self._history_objs[-1] = response
+            else:
+                self._history_objs.append(response)
+            self._history_index[response.id] = response
             self.last_bot_message_id = response.id
-        else:
-            self._history_objs.append(response)
-            self._update_ids()
+            self._trim_history()
 
-        return response
+            return response
 
     async def edit_last_user_message(self, new_text: str) -> Message:
         """Edits your last message."""
-        if not self.last_user_message_id:
-            raise ValueError("No user message found to edit.")
+        async with self._lock:
+            if not self.last_user_message_id:
+                raise ValueError("No user message found to edit.")
 
-        updated_msg = await self._client.edit_message(self.last_user_message_id, new_text)
+            updated_msg = await self._client.edit_message(self.last_user_message_id, new_text)
 
-        for i, msg in enumerate(self._history_objs):
-            if msg.id == self.last_user_message_id:
-                self._history_objs[i].content = new_text
-                break
-        return updated_msg
+            msg = self._history_index.get(self.last_user_message_id)
+            if msg: msg.content = new_text
+            return updated_msg
 
     async def edit_last_bot_message(self, new_text: str) -> Message:
         """Edits the bot's last message."""
-        if not self.last_bot_message_id:
-            raise ValueError("No bot message found to edit.")
+        async with self._lock:
+            if not self.last_bot_message_id:
+                raise ValueError("No bot message found to edit.")
 
-        updated_msg = await self._client.edit_message(self.last_bot_message_id, new_text)
+            updated_msg = await self._client.edit_message(self.last_bot_message_id, new_text)
 
-        for i, msg in enumerate(self._history_objs):
-            if msg.id == self.last_bot_message_id:
-                self._history_objs[i].content = new_text
-                break
-        return updated_msg
+            msg = self._history_index.get(self.last_bot_message_id)
+            if msg: msg.content = new_text
+            return updated_msg
 
-    async def undo(self) -> bool:
-        """Rewinds the chat by deleting the last interaction (User+Bot)."""
-        if not self.conversation_id: return False
-
-        ids_to_delete = []
-        if self.last_bot_message_id: ids_to_delete.append(self.last_bot_message_id)
-        if self.last_user_message_id: ids_to_delete.append(self.last_user_message_id)
-
-        if not ids_to_delete: return False
-
-        await self._client.delete_messages(self.conversation_id, ids_to_delete)
-
-        self._history_objs = [m for m in self._history_objs if m.id not in ids_to_delete]
-        self._update_ids()
+    async def undo(self, bulk_queue: Optional[List[Tuple[str, List[str]]]] = None) -> bool:
+        """
+        Rewinds the chat by deleting the last interaction (User+Bot).
+        :param bulk_queue: If given, the server-side delete is appended here instead of sent;
+            pass the queue to SpicyClient.flush_undo_queue() to send all of them at once.
+            Local history is rewound immediately either way.
+        """
+        async with self._lock:
+            if not self.conversation_id: return False
+
+            ids_to_delete = []
+            if self.last_bot_message_id: ids_to_delete.append(self.last_bot_message_id)
+            if self.last_user_message_id: ids_to_delete.append(self.last_user_message_id)
+
+            if not ids_to_delete: return False
+
+            if bulk_queue is not None:
+                bulk_queue.append((self.conversation_id, ids_to_delete))
+            else:
+                await self._client.delete_messages(self.conversation_id, ids_to_delete)
+
+            # The pointers are the newest user/bot messages, so they normally sit at the tail.
+            to_drop = frozenset(ids_to_delete)
+            history = self._history_objs
+            while history and history[-1].id in to_drop:
+                self._history_index.pop(history.pop().id, None)
+            # A same-role message can sit between the two (e.g. two user turns in a row).
+            leftover = to_drop.intersection(self._history_index)
+            if leftover:
+                self._history_objs = [m for m in history if m.id not in leftover]
+                for message_id in leftover:
+                    del self._history_index[message_id]
+            # The old pointers were just deleted; the rescan stops at the new tail pair.
+            self.last_user_message_id = self.last_bot_message_id = None
+            self._update_ids()
 
-        logger.info(f"Undid {len(ids_to_delete)} messages.")
-        return True
+            logger.info(f"Undid {len(ids_to_delete)} messages.")
+            return True
 
     async def switch_persona(self, persona_name: str):
         if not self._client.personas: await self._client.get_personas()
-        found = next((p for p in self._client.personas if p.name.lower() == persona_name.lower()), None)
+        found = self._client._personas_by_name.get(persona_name.lower())
         if not found: raise ValueError(f"Persona '{persona_name}' not found.")
 
         self.persona_id = found.id
@@ -218,17 +330,38 @@ class SpicyClient:
     """The main high-level client."""
 
     def __init__(self, guest_id: Optional[str] = None):
-        self.guest_id = guest_id or DEFAULT_GUEST_ID
+        self.guest_id = guest_id or get_default_guest_id()
         self._auth_manager = AuthManager()
         self._http = HttpManager(self._auth_manager, self.guest_id)
+        # Long-lived so repeated avatar uploads reuse the connection to the bucket.
+        self._s3_client = httpx.AsyncClient(
+            http2=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=8)
+        )
 
         self.user: Optional[User] = None
         self.settings: Optional[UserSettings] = None
         self.personas: Optional[List[Persona]] = None
+        # lowercased name -> persona, rebuilt with self.personas
+        self._personas_by_name: Dict[str, Persona] = {}
         self.app_settings: Optional[ApplicationSettings] = None
         self.typesense_api_key: Optional[str] = None
         self.recombee_url = "https://client-rapi-ca-east.recombee.com/spicychat-prod"
 
+        # key -> (monotonic timestamp, value) for _cached_get
+        self._cache: Dict[str, Tuple[float, Any]] = {}
+        # key -> bumped by _invalidate, so fetches that straddle it are not cached;
+        # "search" covers every search() key and is bumped by invalidate_search_cache
+        self._cache_generations: Dict[str, int] = {}
+        # (query, per_page) -> (monotonic timestamp, result), least recently used first
+        self._search_cache: "OrderedDict[Tuple[str, int], Tuple[float, SearchResult]]" = OrderedDict()
+        # key -> running fetch shared by concurrent callers, see _single_flight
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Created on first use, since they need a running event loop.
+        self._recombee_queue: Optional[asyncio.Queue] = None
+        self._recombee_flusher: Optional[asyncio.Task] = None
+
     # --- High-Level Methods ---
 
     async def start_chat(self, character_query: str, new_chat: bool = False) -> ChatSession:
@@ -238,14 +371,25 @@ class SpicyClient:
         """
         if not self.user: raise AuthenticationError("Please login() first.")
 
-        search = await self.search(character_query)
-        if not search.hits: raise ValueError(f"Character '{character_query}' not found.")
+        # The conversation list does not depend on which character matches,
+        # so fetch it alongside the search instead of after it.
+        convs_task = None if new_chat else asyncio.create_task(self.get_conversations(limit=50))
+        try:
+            search = await self._search(character_query, 10)
+        except BaseException:
+            if convs_task: convs_task.cancel()
+            raise
+        if not search.hits:
+            if convs_task: convs_task.cancel()
+            raise ValueError(f"Character '{character_query}' not found.")
         character = search.hits[0].document
 
         existing_conv_id = None
-        if not new_chat:
+        if convs_task:
             logger.info(f"Checking for existing conversations with {character.name}...")
-            existing_conv_id = await self._find_existing_conversation_id(character.id)
+            try:
+                existing_conv_id = self._find_conversation_id(await convs_task, character.id)
+            except Exception: pass
 
         session = ChatSession(self, character, conversation_id=existing_conv_id)
 
@@ -260,8 +404,7 @@ class SpicyClient:
     async def create_persona(self, name: str, description: str, avatar_path: str) -> Persona:
         if not self.user: raise AuthenticationError("Please login() first.")
         try:
-            with open(avatar_path, "rb") as f:
-                image_bytes = f.read()
+            image_bytes, image_hash = await asyncio.to_thread(_read_and_hash, avatar_path)
         except FileNotFoundError:
             raise ValueError(f"Avatar file not found: {avatar_path}")
 
@@ -269,42 +412,125 @@ class SpicyClient:
         if not mime_type or not mime_type.startswith("image/"):
             raise ValueError("Invalid image file.")
 
-        upload_data = await self._get_upload_url(image_bytes, mime_type)
+        upload_data = await self._get_upload_url(image_hash, mime_type)
         await self._upload_to_s3(upload_data['signed_url'], image_bytes, mime_type)
 
         payload = {"name": name, "highlights": description, "avatar_url": upload_data['key'], "is_default": False}
         response = await self._http.post(f"{BASE_URL}/personas", authenticated=True, json=payload)
-        new_persona = Persona(**response.json())
-        await self.get_personas()
+        new_persona = Persona.model_validate_json(response.content)
+        # The POST already returns the created persona; no need to refetch the whole list.
+        # The cached list is this same object, so it stays in sync too.
+        if self.personas is not None:
+            self.personas.append(new_persona)
+            self._personas_by_name.setdefault(new_persona.name.lower(), new_persona)
+        if "personas" in self._inflight:
+            # A list fetch that started before the POST would not include the new persona.
+            self._invalidate("personas")
         return new_persona
 
     async def delete_persona(self, name: str) -> bool:
         if not self.personas: await self.get_personas()
-        found = next((p for p in self.personas if p.name.lower() == name.lower()), None)
+        found = self._personas_by_name.get(name.lower())
         if not found: return False
 
         response = await self._http.delete(f"{BASE_URL}/personas/{found.id}", authenticated=True)
-        if response.is_success: await self.get_personas()
+        if response.is_success:
+            self._invalidate("personas")
+            await self.get_personas()
         return response.is_success
 
     async def rate_bot(self, character_query: str, action: RatingAction = RatingAction.LIKE):
-        search = await self.search(character_query)
+        search = await self._search(character_query, 10)
         if not search.hits: return False
         char_id = search.hits[0].document.id
 
-        payload = {"userId": self.user.id, "itemId": char_id, "rating": action.value, "cascadeCreate": True}
-        await self._http.post(f"{self.recombee_url}/ratings/", json=payload)
+        params = {"userId": self.user.id, "itemId": char_id, "rating": action.value, "cascadeCreate": True}
+        await self._send_recombee("POST", "/ratings/", params)
         return True
 
     # --- Internal Helpers ---
 
-    async def _find_existing_conversation_id(self, character_id: str) -> Optional[str]:
+    @staticmethod
+    def _find_conversation_id(conversations: List[Conversation], character_id: str) -> Optional[str]:
+        return next((conv.id for conv in conversations if conv.character_id == character_id), None)
+
+    async def _cached_get(self, key: str, ttl: float, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            entry = self._cache.get(key)
+            if entry and time.monotonic() - entry[0] < ttl:
+                return entry[1]
+            generation = self._cache_generations.get(key, 0)
+            value = await self._single_flight(key, fetch)
+            if self._cache_generations.get(key, 0) == generation:
+                self._cache[key] = (time.monotonic(), value)
+                return value
+            # Invalidated while fetching, so the value may predate the change; fetch again.
+
+    async def _single_flight(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Runs fetch() once for all concurrent callers asking for the same key."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            # _invalidate may already have replaced this entry with a newer fetch.
+            task.add_done_callback(lambda t: self._inflight.get(key) is t and self._inflight.pop(key))
+        # Shielded so a cancelled caller does not cancel the fetch for the others.
+        return await asyncio.shield(task)
+
+    def _invalidate(self, key: str):
+        """Drops the cached value and detaches any fetch already in flight for it."""
+        self._cache.pop(key, None)
+        self._inflight.pop(key, None)
+        self._cache_generations[key] = self._cache_generations.get(key, 0) + 1
+
+    def _send_recombee(self, method: str, path: str, params: Dict[str, Any]) -> asyncio.Future:
+        """Queues a Recombee request; the future resolves once its batch has been sent."""
+        if self._recombee_queue is None:
+            self._recombee_queue = asyncio.Queue()
+        # Restart the flusher if it has died, so queued requests are never stranded.
+        if self._recombee_flusher is None or self._recombee_flusher.done():
+            self._recombee_flusher = asyncio.create_task(self._flush_recombee())
+        future = asyncio.get_running_loop().create_future()
+        self._recombee_queue.put_nowait(({"method": method, "path": path, "params": params}, future))
+        return future
+
+    async def _flush_recombee(self):
+        queue = self._recombee_queue
+        while True:
+            batch = [await queue.get()]
+            # Give a burst of interactions a moment to pile up behind the first one.
+            await asyncio.sleep(_RECOMBEE_FLUSH_INTERVAL)
+            while len(batch) < _RECOMBEE_MAX_BATCH and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                await self._post_recombee_batch(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _post_recombee_batch(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
         try:
-            conversations = await self.get_conversations(limit=50)
-            for conv in conversations:
-                if conv.character_id == character_id: return conv.id
-        except Exception: pass
-        return None
+            response = await self._http.post(f"{self.recombee_url}/batch/", json={"requests": [r for r, _ in batch]})
+            results = parse_json(response)
+            if not isinstance(results, list) or len(results) != len(batch):
+                raise APIError(response.status_code, f"Unexpected Recombee batch response: {response.text}")
+
+            # One {"code": ..., "json": ...} entry per request, in order.
+            for (_, future), result in zip(batch, results):
+                if future.done(): continue
+                if not isinstance(result, dict):
+                    raise APIError(response.status_code, f"Unexpected Recombee batch entry: {result!r}")
+                code = result.get("code", 200)
+                if 200 <= code < 300:
+                    future.set_result(result.get("json"))
+                else:
+                    body = result.get("json")
+                    message = body.get("message", str(body)) if isinstance(body, dict) else str(body)
+                    future.set_exception(APIError(code, message))
+        except Exception as e:
+            # Whatever went wrong, every caller still waiting on this batch hears about it.
+            for _, future in batch:
+                if not future.done(): future.set_exception(e)
 
     # --- Core API (Boilerplate) ---
 
@@ -320,87 +546,168 @@ class SpicyClient:
         await asyncio.gather(*tasks, return_exceptions=True)
 
     async def get_user_profile(self) -> User:
+        return await self._single_flight("user_profile", self._fetch_user_profile)
+
+    async def _fetch_user_profile(self) -> User:
         response = await self._http.get(f"{BASE_URL}/v2/users", authenticated=True)
-        self.user = User(**response.json()["user"])
+        self.user = UserResponse.model_validate_json(response.content).user
         return self.user
 
     async def get_user_settings(self) -> UserSettings:
+        return await self._cached_get("user_settings", _USER_SETTINGS_TTL, self._fetch_user_settings)
+
+    async def _fetch_user_settings(self) -> UserSettings:
         response = await self._http.get(f"{BASE_URL}/users/settings", authenticated=True)
-        self.settings = UserSettings(**response.json())
+        self.settings = UserSettings.model_validate_json(response.content)
         return self.settings
 
     async def get_personas(self) -> List[Persona]:
+        personas = await self._cached_get("personas", _PERSONAS_TTL, self._fetch_personas)
+        # Set here rather than in the fetch, so a fetch that was invalidated mid-flight never lands.
+        if personas is not self.personas:
+            self.personas = personas
+            # Built back to front so the first persona wins on duplicate names, as the old scan did.
+            self._personas_by_name = {p.name.lower(): p for p in reversed(personas)}
+        return personas
+
+    async def _fetch_personas(self) -> List[Persona]:
         response = await self._http.get(f"{BASE_URL}/personas", authenticated=True)
-        self.personas = [Persona(**p) for p in response.json()]
-        return self.personas
+        return _PERSONA_LIST.validate_json(response.content)
 
     async def get_application_settings(self) -> ApplicationSettings:
+        return await self._cached_get("app_settings", _APP_SETTINGS_TTL, self._fetch_application_settings)
+
+    async def _fetch_application_settings(self) -> ApplicationSettings:
         response = await self._http.get(f"{BASE_URL}/v2/applications/spicychat", authenticated=True)
-        self.app_settings = ApplicationSettings(**response.json())
-        if "typesenseConfig" in response.json(): self.typesense_api_key = response.json()["typesenseConfig"]["apiKeyPublicCharacter"]
+        self.app_settings = ApplicationSettings.model_validate_json(response.content)
+        # typesenseConfig is a required field, so validation already guarantees it is there.
+        self.typesense_api_key = self.app_settings.typesenseConfig.apiKeyPublicCharacter
         return self.app_settings
 
     async def search(self, query: str, per_page: int = 10) -> SearchResult:
+        """
+        Searches public characters. Results are cached for a short while and shared
+        between callers, so each call returns its own deep copy that is safe to modify.
+        """
+        return (await self._search(query, per_page)).model_copy(deep=True)
+
+    async def _search(self, query: str, per_page: int) -> SearchResult:
+        """Cached search returning the shared instance; internal callers only read it."""
+        key = (query, per_page)
+        while True:
+            entry = self._search_cache.get(key)
+            if entry and time.monotonic() - entry[0] < _SEARCH_TTL:
+                self._search_cache.move_to_end(key)
+                return entry[1]
+
+            generation = self._cache_generations.get("search", 0)
+            result = await self._single_flight(f"search:{per_page}:{query}", lambda: self._fetch_search(query, per_page))
+            if self._cache_generations.get("search", 0) == generation:
+                self._search_cache[key] = (time.monotonic(), result)
+                self._search_cache.move_to_end(key)
+                if len(self._search_cache) > _SEARCH_CACHE_SIZE:
+                    self._search_cache.popitem(last=False)
+                return result
+            # invalidate_search_cache() ran while fetching, so the result may predate it; fetch again.
+
+    def invalidate_search_cache(self):
+        """Forgets cached search results so the next search() hits Typesense again."""
+        self._search_cache.clear()
+        # Same contract as _invalidate: searches already in flight are detached and not cached.
+        for key in [k for k in self._inflight if k.startswith("search:")]:
+            del self._inflight[key]
+        self._cache_generations["search"] = self._cache_generations.get("search", 0) + 1
+
+    async def _fetch_search(self, query: str, per_page: int) -> SearchResult:
         if not self.typesense_api_key: await self.get_application_settings()
-        search_payload = {"searches": [{"query_by": "name,title,tags,creator_username,character_id","exclude_fields":"application_ids,greeting,moderation_flags,moderation_keywords,moderation_status,reportsType","sort_by": "num_messages_24h:desc","highlight_full_fields":"name,title,tags,creator_username,character_id","collection": "public_characters_alias","q": query,"per_page": per_page}]}
-        headers = {"x-typesense-api-key": self.typesense_api_key, "content-type": "text/plain"}
-        response = await self._http.post(f"{TYPESENSE_URL}/multi_search", data=json.dumps(search_payload), headers=headers)
-        return SearchResult(**response.json()["results"][0])
+        body = _SEARCH_PREFIX + orjson.dumps(query) + _SEARCH_MID + orjson.dumps(per_page) + _SEARCH_SUFFIX
+        headers = {**_SEARCH_HEADERS, "x-typesense-api-key": self.typesense_api_key}
+        response = await self._http.post(f"{TYPESENSE_URL}/multi_search", content=body, headers=headers)
+        return SearchResponse.model_validate_json(response.content).results[0]
 
     async def get_conversations(self, limit: int = 25) -> List[Conversation]:
+        return await self._single_flight(f"conversations:{limit}", lambda: self._fetch_conversations(limit))
+
+    async def _fetch_conversations(self, limit: int) -> List[Conversation]:
         params = {"limit": limit}
         response = await self._http.get(f"{BASE_URL}/v2/conversations", authenticated=True, params=params)
-        return [Conversation(**c) for c in response.json()]
+        return _CONVERSATION_LIST.validate_json(response.content)
 
     async def get_conversation_history(self, character_id: str, limit: int = 50) -> List[Message]:
+        return await self._single_flight(
+            f"history:{character_id}:{limit}",
+            lambda: self._fetch_conversation_history(character_id, limit)
+        )
+
+    async def _fetch_conversation_history(self, character_id: str, limit: int) -> List[Message]:
         params = {"limit": limit}
         response = await self._http.get(f"{BASE_URL}/characters/{character_id}/messages", authenticated=True, params=params)
-        return [Message(**m) for m in response.json().get("messages", [])]
+        return MessagesResponse.model_validate_json(response.content).messages
 
     async def send_message(self, character_id: str, message: str, model: ChatModel = ChatModel.SPICEDQ3_A3B, persona_id: Optional[str] = None, conversation_id: Optional[str] = None, generation_settings: Optional[Union[GenerationSettings, Dict[str, Any]]] = None) -> Message:
         if not self.user: raise AuthenticationError("User not logged in.")
-        gen_settings = generation_settings or GenerationSettings()
-        if isinstance(gen_settings, dict): gen_settings = GenerationSettings(**gen_settings)
-        payload = {"message": message, "character_id": character_id, "inference_model": model.value, "user_persona_id": persona_id or (self.user.default_persona_id if self.user else None), "inference_settings": gen_settings.model_dump()}
+        payload = {"message": message, "character_id": character_id, "inference_model": model, "user_persona_id": persona_id or (self.user.default_persona_id if self.user else None), "inference_settings": _inference_settings(generation_settings)}
         if conversation_id: payload["conversation_id"] = conversation_id
         response = await self._http.post(f"{CHAT_API_URL}/chat", authenticated=True, json=payload)
-        return Message(**response.json()["message"])
+        return MessageResponse.model_validate_json(response.content).message
 
     async def regenerate_response(self, conversation_id: str, character_id: str, last_user_message_id: str, model: ChatModel = ChatModel.SPICEDQ3_A3B, generation_settings: Optional[Union[GenerationSettings, Dict[str, Any]]] = None) -> Message:
-        gen_settings = generation_settings or GenerationSettings()
-        if isinstance(gen_settings, dict): gen_settings = GenerationSettings(**gen_settings)
-        payload = {"character_id": character_id, "inference_model": model.value, "inference_settings": gen_settings.model_dump(), "continue_chat": True, "conversation_id": conversation_id, "prev_id": last_user_message_id}
+        payload = {"character_id": character_id, "inference_model": model, "inference_settings": _inference_settings(generation_settings), "continue_chat": True, "conversation_id": conversation_id, "prev_id": last_user_message_id}
         response = await self._http.post(f"{CHAT_API_URL}/chat", authenticated=True, json=payload)
-        return Message(**response.json()["message"])
+        return MessageResponse.model_validate_json(response.content).message
 
     async def edit_message(self, message_id: str, new_content: str) -> Message:
         payload = {"content": new_content}
         response = await self._http.patch(f"{BASE_URL}/messages/{message_id}", authenticated=True, json=payload)
-        return Message(**response.json())
+        return Message.model_validate_json(response.content)
 
     async def delete_messages(self, conversation_id: str, message_ids: List[str]) -> List[DeletedMessage]:
         payload = {"ids": message_ids}
         response = await self._http.delete(f"{BASE_URL}/conversations/{conversation_id}/messages", authenticated=True, json=payload)
-        raw_list = response.json()
+        raw_list = parse_json(response)
         if not isinstance(raw_list, list): raw_list = [raw_list] if raw_list else []
-        return [DeletedMessage(**m) for m in raw_list if m]
+        return _DELETED_LIST.validate_python([m for m in raw_list if m])
+
+    async def delete_messages_bulk(self, items: List[Tuple[str, List[str]]]) -> List[Union[List[DeletedMessage], BaseException]]:
+        """
+        Deletes messages across several conversations concurrently, one request per conversation.
+        Returns one result per conversation (in first-seen order); failures are returned, not raised.
+        """
+        grouped: Dict[str, List[str]] = {}
+        for conversation_id, message_ids in items:
+            grouped.setdefault(conversation_id, []).extend(message_ids)
+        return await asyncio.gather(
+            *(self.delete_messages(conversation_id, ids) for conversation_id, ids in grouped.items()),
+            return_exceptions=True
+        )
+
+    async def flush_undo_queue(self, queue: List[Tuple[str, List[str]]]) -> List[Union[List[DeletedMessage], BaseException]]:
+        """Sends the deletes collected by ChatSession.undo(bulk_queue=...) and empties the queue."""
+        items = list(queue)
+        queue.clear()
+        return await self.delete_messages_bulk(items)
 
     async def switch_persona_for_chat(self, conversation_id: str, persona_id: str) -> bool:
         payload = {"user_persona_id": persona_id}
         response = await self._http.patch(f"{BASE_URL}/conversations/{conversation_id}/user_persona", authenticated=True, json=payload)
         return response.status_code == 200
 
-    async def _get_upload_url(self, image_bytes: bytes, mime_type: str) -> Dict[str, str]:
-        image_hash = hashlib.md5(image_bytes).hexdigest()
+    async def _get_upload_url(self, image_hash: str, mime_type: str) -> Dict[str, str]:
         payload = {"image_type": mime_type, "hash": image_hash}
         response = await self._http.post(f"{BASE_URL}/save-image", authenticated=True, json=payload)
-        return response.json()
+        return parse_json(response)
 
     async def _upload_to_s3(self, upload_url: str, image_bytes: bytes, mime_type: str):
         headers = {'Content-Type': mime_type}
-        async with httpx.AsyncClient() as s3_client:
-            await s3_client.put(upload_url, content=image_bytes, headers=headers)
+        await self._s3_client.put(upload_url, content=image_bytes, headers=headers)
 
     async def close(self):
+        if self._recombee_flusher:
+            # Let queued interactions go out before tearing down the transport.
+            if not self._recombee_flusher.done():
+                await self._recombee_queue.join()
+            self._recombee_flusher.cancel()
+            self._recombee_flusher = None
         await self._http.close()
+        await self._s3_client.aclose()
         await self._auth_manager.close()
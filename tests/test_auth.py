@@ -0,0 +1,122 @@
+import asyncio
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import httpx
+
+from spicy import _auth
+from spicy._auth import AuthManager, REFRESH_WINDOW
+from spicy._models import TokenData
+
+
+class LoadTokenTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.token_file = Path(tmp.name) / "tokens.json"
+        patcher = mock.patch.object(_auth, "TOKEN_FILE", self.token_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.auth = AuthManager()
+        self.addAsyncCleanup(self.auth.close)
+
+    async def test_invalid_token_file_is_discarded(self):
+        for content in (b"[]", b"null", b"{}", b"not json"):
+            with self.subTest(content=content):
+                self.token_file.write_bytes(content)
+                self.assertIsNone(await self.auth._load_token())
+                self.assertFalse(self.token_file.exists())
+
+    async def test_missing_token_file(self):
+        self.assertIsNone(await self.auth._load_token())
+
+
+def make_token(access_token: str = "old", seconds_left: float = 3600) -> TokenData:
+    return TokenData(
+        access_token=access_token, expires_in=3600, id_token="id", refresh_token="refresh",
+        scope="openid", token_type="bearer", created_at=time.time() - 3600 + seconds_left,
+    )
+
+
+class RefreshTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.token_file = Path(tmp.name) / "tokens.json"
+        for name, value in (("CONFIG_DIR", Path(tmp.name)), ("TOKEN_FILE", self.token_file)):
+            patcher = mock.patch.object(_auth, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.refresh_requests = 0
+        self.refresh_response = lambda: httpx.Response(
+            200, json={"access_token": "new", "expires_in": 3600, "scope": "openid", "token_type": "bearer"}
+        )
+
+        async def handle(request: httpx.Request) -> httpx.Response:
+            self.refresh_requests += 1
+            await asyncio.sleep(0.05)
+            return self.refresh_response()
+
+        self.auth = AuthManager()
+        await self.auth._auth_client.aclose()
+        self.auth._auth_client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+        self.addAsyncCleanup(self.auth.close)
+
+    async def _settle(self):
+        if self.auth._refresh_task:
+            await asyncio.gather(self.auth._refresh_task, return_exceptions=True)
+
+    async def test_fresh_token_is_not_refreshed(self):
+        self.auth._set_token(make_token())
+        self.assertEqual((await self.auth.get_token()).access_token, "old")
+        self.assertEqual(self.refresh_requests, 0)
+
+    async def test_stale_token_is_returned_and_refreshed_once(self):
+        self.auth._set_token(make_token(seconds_left=REFRESH_WINDOW / 2))
+        tokens = await asyncio.gather(*(self.auth.get_token() for _ in range(5)))
+        self.assertEqual({t.access_token for t in tokens}, {"old"})
+
+        await self._settle()
+        self.assertEqual(self.refresh_requests, 1)
+        self.assertEqual((await self.auth.get_token()).access_token, "new")
+        # Tokens the server did not rotate are kept.
+        self.assertEqual(self.auth._token_data.refresh_token, "refresh")
+        self.assertTrue(self.token_file.exists())
+
+    async def test_expired_token_shares_one_refresh(self):
+        self.auth._set_token(make_token(seconds_left=-10))
+        tokens = await asyncio.gather(*(self.auth.get_token() for _ in range(10)))
+        self.assertEqual({t.access_token for t in tokens}, {"new"})
+        self.assertEqual(self.refresh_requests, 1)
+
+    async def test_failed_refresh_discards_expired_token(self):
+        self.refresh_response = lambda: httpx.Response(400, json={"error": "invalid_grant"})
+        self.token_file.write_bytes(b"{}")
+        self.auth._set_token(make_token(seconds_left=-10))
+        self.assertIsNone(await self.auth.get_token())
+        self.assertIsNone(self.auth._token_data)
+        self.assertFalse(self.token_file.exists())
+
+    async def test_failed_stale_refresh_backs_off(self):
+        self.refresh_response = lambda: httpx.Response(400, json={"error": "invalid_grant"})
+        self.auth._set_token(make_token(seconds_left=REFRESH_WINDOW / 2))
+        for _ in range(10):
+            self.assertEqual((await self.auth.get_token()).access_token, "old")
+            await self._settle()
+        self.assertEqual(self.refresh_requests, 1)
+
+    async def test_malformed_refresh_body_discards_expired_token(self):
+        for body in (b"not json", b"[]", b'{"access_token": "new"}'):
+            with self.subTest(body=body):
+                self.refresh_response = lambda: httpx.Response(200, content=body)
+                self.auth._set_token(make_token(seconds_left=-10))
+                self.assertIsNone(await self.auth.get_token())
+                self.assertIsNone(self.auth._token_data)
+
+
+if __name__ == "__main__":
+    unittest.main()
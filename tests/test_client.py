@@ -0,0 +1,189 @@
+import asyncio
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+import httpx
+
+from spicy.client import SpicyClient
+from spicy._models import TokenData
+from spicy._exceptions import APIError
+
+CHARACTER = {
+    "id": "c1", "name": "Bot", "visibility": "public", "num_messages": 1, "is_nsfw": False,
+    "avatar_is_nsfw": False, "definition_visible": True, "tags": [], "language": "en", "token_count": 1,
+    "createdAt": "2024-01-01T00:00:00Z", "updatedAt": "2024-01-01T00:00:00Z",
+}
+USER = {
+    "id": "u1", "name": "User", "username": "user", "email": "user@example.com", "token": "t",
+    "subscription": {}, "default_persona_id": "p1",
+}
+
+
+class ClientTestCase(unittest.IsolatedAsyncioTestCase):
+    """Runs a SpicyClient against an in-process transport; tests set self.routes[(method, path)]."""
+
+    async def asyncSetUp(self):
+        self.routes = {
+            ("GET", "/v2/users"): lambda request: httpx.Response(200, json={"user": USER}),
+            ("POST", "/multi_search"): lambda request: httpx.Response(
+                200, json={"results": [{"found": 1, "hits": [{"document": CHARACTER, "highlights": []}]}]}
+            ),
+        }
+        self.client = SpicyClient()
+        transport = httpx.MockTransport(self._handle)
+        await self.client._http.close()
+        self.client._http._client = httpx.AsyncClient(transport=transport)
+        self.client._auth_manager._set_token(TokenData(
+            access_token="a", expires_in=3600, id_token="i", refresh_token="r", scope="s", token_type="bearer"
+        ))
+        self.client.typesense_api_key = "key"
+        await self.client.get_user_profile()
+
+    async def asyncTearDown(self):
+        await asyncio.wait_for(self.client.close(), timeout=5)
+
+    async def _handle(self, request: httpx.Request) -> httpx.Response:
+        route = self.routes.get((request.method, request.url.path))
+        if route is None:
+            return httpx.Response(404, json={"message": "no route"})
+        response = route(request)
+        return await response if asyncio.iscoroutine(response) else response
+
+
+class RecombeeBatchTests(ClientTestCase):
+    async def test_malformed_batch_response_fails_callers(self):
+        self.routes[("POST", "/spicychat-prod/batch/")] = lambda request: httpx.Response(200, json={})
+        with self.assertRaises(APIError):
+            await asyncio.wait_for(self.client.rate_bot("bot"), timeout=5)
+
+        # The flusher survives, so later interactions still go out.
+        self.routes[("POST", "/spicychat-prod/batch/")] = lambda request: httpx.Response(
+            200, json=[{"code": 200, "json": "ok"}]
+        )
+        self.assertTrue(await asyncio.wait_for(self.client.rate_bot("bot"), timeout=5))
+
+    async def test_non_dict_batch_entry_fails_callers(self):
+        self.routes[("POST", "/spicychat-prod/batch/")] = lambda request: httpx.Response(200, json=[None])
+        with self.assertRaises(APIError):
+            await asyncio.wait_for(self.client.rate_bot("bot"), timeout=5)
+
+
+class StartChatTests(ClientTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.history_requests = 0
+
+        def history(request):
+            self.history_requests += 1
+            return httpx.Response(200, json={"messages": [
+                {"conversation_id": "conv1", "role": "bot", "id": "m2", "content": "hi"},
+                {"conversation_id": "conv1", "role": "user", "id": "m1", "content": "hey"},
+            ]})
+        self.routes[("GET", "/characters/c1/messages")] = history
+
+    def _conversations(self, character_id: str):
+        self.routes[("GET", "/v2/conversations")] = lambda request: httpx.Response(200, json=[
+            {"id": "conv1", "character_id": character_id, "last_message": None, "character": {}, "label": "x"}
+        ])
+
+    async def test_resumes_existing_conversation(self):
+        self._conversations("c1")
+        session = await self.client.start_chat("bot")
+        self.assertEqual(session.conversation_id, "conv1")
+        self.assertEqual(session.last_user_message_id, "m1")
+        self.assertEqual(session.last_bot_message_id, "m2")
+
+    async def test_no_history_request_without_conversation(self):
+        self._conversations("someone-else")
+        session = await self.client.start_chat("bot")
+        self.assertIsNone(session.conversation_id)
+        self.assertEqual(self.history_requests, 0)
+
+
+class SearchCacheTests(ClientTestCase):
+    async def test_cached_results_are_not_shared(self):
+        first = await self.client.search("bot")
+        first.hits[0].document.name = "Changed"
+        first.hits.clear()
+
+        second = await self.client.search("bot")
+        self.assertEqual(second.hits[0].document.name, "Bot")
+
+    async def test_search_straddling_invalidation_is_not_cached(self):
+        names = iter(["Old", "New"])
+        gate = asyncio.Event()
+
+        async def multi_search(request):
+            name = next(names)
+            if name == "Old": await gate.wait()
+            document = {**CHARACTER, "name": name}
+            return httpx.Response(200, json={"results": [{"found": 1, "hits": [{"document": document, "highlights": []}]}]})
+        self.routes[("POST", "/multi_search")] = multi_search
+
+        stale = asyncio.create_task(self.client.search("bot"))
+        await asyncio.sleep(0.05)
+        self.client.invalidate_search_cache()
+        fresh = asyncio.create_task(self.client.search("bot"))
+        await asyncio.sleep(0.05)
+        gate.set()
+
+        self.assertEqual((await asyncio.wait_for(fresh, timeout=5)).hits[0].document.name, "New")
+        self.assertEqual((await asyncio.wait_for(stale, timeout=5)).hits[0].document.name, "New")
+        self.assertEqual((await self.client.search("bot")).hits[0].document.name, "New")
+
+
+class PersonaCacheTests(ClientTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.personas = [{"id": "p1", "name": "Alice"}, {"id": "p2", "name": "Bob"}]
+        self.gate = None
+
+        async def list_personas(request):
+            snapshot, gate = list(self.personas), self.gate
+            self.gate = None
+            if gate: await gate.wait()
+            return httpx.Response(200, json=snapshot)
+
+        def delete_persona(request):
+            self.personas = [p for p in self.personas if p["id"] != request.url.path.rsplit("/", 1)[-1]]
+            return httpx.Response(200, json={})
+
+        self.routes[("GET", "/personas")] = list_personas
+        self.routes[("DELETE", "/personas/p2")] = delete_persona
+
+    async def test_fetch_straddling_delete_is_not_cached(self):
+        await self.client.get_personas()
+        self.client._cache["personas"] = (float("-inf"), self.client.personas)  # expired
+
+        gate = self.gate = asyncio.Event()
+        stale = asyncio.create_task(self.client.get_personas())
+        await asyncio.sleep(0.05)
+        self.assertTrue(await asyncio.wait_for(self.client.delete_persona("bob"), timeout=5))
+        gate.set()
+
+        self.assertEqual([p.id for p in await asyncio.wait_for(stale, timeout=5)], ["p1"])
+        self.assertEqual([p.id for p in await self.client.get_personas()], ["p1"])
+        self.assertEqual([p.id for p in self.client.personas], ["p1"])
+        self.assertNotIn("bob", self.client._personas_by_name)
+
+
+class OtpCallbackTests(unittest.TestCase):
+    def test_piped_otp_after_earlier_input(self):
+        # Scripts often read the email from the same pipe first; the OTP must still come through.
+        script = (
+            "import asyncio\n"
+            "from spicy.client import default_otp_callback\n"
+            "input()\n"
+            "print('OTP=' + asyncio.run(default_otp_callback()))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script], input="me@example.com\n123456\n",
+            capture_output=True, text=True, timeout=30, cwd=Path(__file__).resolve().parents[1],
+        )
+        self.assertIn("OTP=123456", result.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
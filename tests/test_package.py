@@ -0,0 +1,20 @@
+import unittest
+
+import spicy
+
+
+class LazyExportTests(unittest.TestCase):
+    def test_dir_lists_lazy_exports(self):
+        for name in spicy.__all__:
+            with self.subTest(name=name):
+                self.assertIn(name, dir(spicy))
+
+    def test_lazy_exports_resolve(self):
+        from spicy.client import SpicyClient
+        self.assertIs(spicy.SpicyClient, SpicyClient)
+        with self.assertRaises(AttributeError):
+            spicy.NotAThing
+
+
+if __name__ == "__main__":
+    unittest.main()